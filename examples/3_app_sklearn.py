@@ -20,13 +20,24 @@ class MyObjective(BaseObjective):
 
         self.monitor = "accuracy"
 
+        pending_reports = []
         for step in range(100):
             clf.partial_fit(train_x, train_y, classes=classes)
-            intermediate_value = clf.score(valid_x, valid_y)
+
+            # The model is only evaluated every 5 steps.
+            if (step + 1) % 5 == 0:
+                intermediate_value = clf.score(valid_x, valid_y)
+                pending_reports.append([intermediate_value, step])
 
             # WARNING: Assign to reports,
             # so the state is instantly sent to the flow.
-            self.reports = self.reports + [[intermediate_value, step]]
+            # The reports are sent in batches to limit the number of state updates.
+            if (step + 1) % 10 == 0:
+                self.reports = self.reports + pending_reports
+                pending_reports = []
+
+        if pending_reports:
+            self.reports = self.reports + pending_reports
 
         self.best_model_score = clf.score(valid_x, valid_y)
 
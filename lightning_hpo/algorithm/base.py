@@ -3,6 +3,8 @@ from typing import Any, Dict, List
 
 
 class Algorithm(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def register_distributions(self, distributions):
         ...
@@ -9,6 +9,7 @@ from optuna.distributions import (
     LogUniformDistribution,
     UniformDistribution,
 )
+from optuna.trial import TrialState
 
 from lightning_hpo.algorithm.base import Algorithm
 from lightning_hpo.distributions import DistributionDict
@@ -41,7 +42,7 @@ class OptunaAlgorithm(Algorithm):
             self.trials[trial_id] = self.study.ask(self.distributions)
 
     def trial_end(self, trial_id: int, score: float):
-        self.study.tell(trial_id, score)
+        self.study.tell(self.trials[trial_id], score)
 
         _logger.info(
             f"Trial {trial_id} finished with value: {score} and parameters: {self.trials[trial_id].params}. "  # noqa: E501
@@ -50,16 +51,18 @@ class OptunaAlgorithm(Algorithm):
 
     def should_prune(self, trial_id: int, reports: List[Tuple[float, int]]) -> bool:
         trial = self.trials[trial_id]
-        if trial_id not in self.reports:
+        # The objective reports are reset when it restarts, so they are all sent again.
+        if trial_id not in self.reports or len(reports) < len(self.reports[trial_id]):
             self.reports[trial_id] = []
 
-        for report in reports:
-            if report in self.reports[trial_id]:
-                continue
+        # Otherwise the reports are only appended to, so only the new ones need to be sent to the study.
+        num_reported = len(self.reports[trial_id])
+        for report in reports[num_reported:]:
             trial.report(*report)
             self.reports[trial_id].append(report)
 
             if trial.should_prune():
+                self.study.tell(trial, state=TrialState.PRUNED)
                 _logger.info(f"Trial {trial_id} pruned.")
                 return True
 
@@ -1,21 +1,35 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
 from typing import List, Optional
 
 import optuna
+import orjson
 import requests
 from lightning import BuildConfig, LightningFlow
 from lightning.app.frontend import StreamlitFrontend
 from lightning.app.storage import Drive
-from lightning.app.storage.path import Path
 from lightning.app.structures import Dict
+from optuna.trial import TrialState
 
 from lightning_hpo import Sweep
 from lightning_hpo.algorithm import OptunaAlgorithm
 from lightning_hpo.commands.sweep import SweepCommand, SweepConfig
-from lightning_hpo.components.servers.db.models import Trial
+from lightning_hpo.components.servers.db.models import get_username, Trial
 from lightning_hpo.components.servers.db.server import Database
+from lightning_hpo.components.servers.db.utils import enable_sqlite_pragmas
 from lightning_hpo.components.servers.db.visualization import DatabaseViz
 from lightning_hpo.components.servers.file_server import FileServer
-from lightning_hpo.utilities.utils import CloudCompute, get_best_model_path
+from lightning_hpo.utilities.utils import CloudCompute
+
+_logger = logging.getLogger(__name__)
+
+_STORE_TIMEOUT = 10.0
+# With the backoff below, the trials are retried for about 5 minutes before being dropped.
+_MAX_STORE_RETRIES = 10
+_MAX_STORE_BACKOFF = 60.0
 
 
 class Sweeper(LightningFlow):
@@ -26,6 +40,17 @@ class Sweeper(LightningFlow):
         self.file_server = FileServer(self.drive)
         self.db = Database()
         self.db_viz = DatabaseViz()
+        self._session = requests.Session()
+        self._executor = None
+        self._storage = None
+        self._pending_trials = []
+        self._store_future = None
+        self._store_retries = 0
+        self._failed_trials = []
+        self._next_retry_at = 0.0
+        self._directions = {}
+        self._best_score = float("-inf")
+        self._best_path = None
 
     def run(self):
         self.file_server.run()
@@ -36,13 +61,111 @@ class Sweeper(LightningFlow):
             for sweep in self.sweeps.values():
                 sweep.run()
                 trials.extend(sweep.get_trials())
-            if trials:
-                for trial in trials:
-                    requests.post(self.db.url + "/trial", data=trial.json())
+            for trial in trials:
+                self._update_best(trial)
+            self._pending_trials.extend(trials)
+
+            # The trials are stored in the background, one request at a time.
+            if self._store_future is not None:
+                if not self._store_future.done():
+                    return
+                failed_trials = self._store_future.result()
+                self._store_future = None
+                if not failed_trials:
+                    self._store_retries = 0
+                elif self._store_retries < _MAX_STORE_RETRIES:
+                    self._failed_trials = failed_trials
+                    self._next_retry_at = time.monotonic() + min(2.0**self._store_retries, _MAX_STORE_BACKOFF)
+                    self._store_retries += 1
+                else:
+                    _logger.error(f"Dropping {len(failed_trials)} trials after {_MAX_STORE_RETRIES} retries.")
+                    self._store_retries = 0
+            if self._failed_trials:
+                # The failed batch is retried on its own, so it can't hold back the new trials.
+                if time.monotonic() < self._next_retry_at:
+                    return
+                self._store_future = self._get_executor().submit(self._store_trials, self._failed_trials)
+                self._failed_trials = []
+            elif self._pending_trials:
+                self._store_future = self._get_executor().submit(self._store_trials, self._pending_trials)
+                self._pending_trials = []
+
+    def _update_best(self, trial: Trial):
+        if not trial.has_succeeded or trial.best_model_score is None:
+            return
+        # The scores are compared as if they were all maximized.
+        score = trial.best_model_score
+        if self._directions.get(trial.sweep_id) == "minimize":
+            score = -score
+        if score > self._best_score:
+            self._best_score = score
+            # Sweep.get_trials stores a missing checkpoint as the string "None".
+            self._best_path = None if trial.best_model_path == "None" else trial.best_model_path
+
+    def _store_trials(self, trials: List[Trial]) -> List[Trial]:
+        """Stores the trials in the database and returns the ones which need to be retried."""
+        try:
+            data = orjson.dumps([trial.dict() for trial in trials])
+        except Exception as e:
+            _logger.error(f"Failed to serialize {len(trials)} trials, they won't be stored: {e}")
+            return []
+
+        try:
+            response = self._session.post(
+                self.db.url + "/trials/",
+                data=data,
+                headers={"Content-Type": "application/json"},
+                timeout=_STORE_TIMEOUT,
+            )
+        except Exception as e:
+            _logger.warning(f"Failed to store {len(trials)} trials: {e}")
+            return trials
+
+        if 400 <= response.status_code < 500:
+            _logger.error(f"The database rejected {len(trials)} trials, they won't be retried: {response.text}")
+            return []
+        if not response.ok:
+            _logger.warning(f"Failed to store {len(trials)} trials: {response.status_code} {response.text}")
+            return trials
+        return []
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Only used to store the trials, so a single worker is enough.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def _get_storage(self) -> optuna.storages.RDBStorage:
+        # The studies are stored next to the trials and the storage is created once for all the sweeps.
+        if self._storage is None:
+            self._storage = optuna.storages.RDBStorage(
+                f"sqlite:///{self.db.db_file_name}",
+                engine_kwargs={"connect_args": {"timeout": 5}},
+            )
+            enable_sqlite_pragmas(self._storage.engine)
+            # The storage already opened connections while creating its tables, they are dropped
+            # so every connection used from now on gets the pragmas.
+            self._storage.engine.dispose()
+        return self._storage
+
+    def _create_study(self, config: SweepConfig) -> optuna.Study:
+        study = optuna.create_study(
+            study_name=config.sweep_id,
+            storage=self._get_storage(),
+            # The constant liar avoids sampling the same parameters for trials running in parallel.
+            sampler=optuna.samplers.TPESampler(constant_liar=config.simultaneous_trials > 1),
+            pruner=optuna.pruners.MedianPruner(n_warmup_steps=10, interval_steps=4),
+            direction=config.direction,
+            load_if_exists=True,
+        )
+        # The trials still running in a study loaded from a previous app run can never be told anymore.
+        for trial in study.get_trials(deepcopy=False, states=(TrialState.RUNNING,)):
+            study.tell(trial.number, state=TrialState.FAIL)
+        return study
 
     def create_sweep(self, config: SweepConfig) -> str:
-        sweep_ids = list(self.sweeps.keys())
-        if config.sweep_id not in sweep_ids:
+        if config.sweep_id not in self.sweeps:
+            self._directions[config.sweep_id] = config.direction
             self.sweeps[config.sweep_id] = Sweep(
                 script_path=config.script_path,
                 n_trials=config.n_trials,
@@ -55,7 +178,7 @@ class Sweeper(LightningFlow):
                 code={"drive": self.drive, "name": config.sweep_id},
                 cloud_build_config=BuildConfig(requirements=config.requirements),
                 logger=config.logger,
-                algorithm=OptunaAlgorithm(optuna.create_study(direction=config.direction)),
+                algorithm=OptunaAlgorithm(self._create_study(config)),
             )
             return f"Launched a sweep {config.sweep_id}"
         elif self.sweeps[config.sweep_id].has_failed:
@@ -69,24 +192,52 @@ class Sweeper(LightningFlow):
         return [{"sweep": SweepCommand(self.create_sweep)}]
 
     @property
-    def best_model_score(self) -> Optional[Path]:
-        return get_best_model_path(self)
+    def best_model_score(self) -> Optional[str]:
+        return self._best_path
 
     def configure_layout(self):
         return StreamlitFrontend(render_fn=render_fn)
 
 
+def _load_trials(_session_factory, db_file_name: str) -> List[dict]:
+    """Returns the trials of the database as plain dictionaries, so Streamlit can cache them."""
+    from sqlmodel import select
+
+    # Only the columns needed for the overview are loaded, the rest is fetched when a trial is selected.
+    with _session_factory() as session:
+        trials = session.exec(
+            select(Trial.id, Trial.username, Trial.sweep_id, Trial.trial_id, Trial.has_succeeded, Trial.url).order_by(
+                Trial.username, Trial.sweep_id
+            )
+        ).all()
+    return [dict(trial._mapping) for trial in trials]
+
+
+@lru_cache(maxsize=1)
+def _get_trials_loader():
+    """Wraps ``_load_trials`` with the Streamlit cache once, streamlit is only imported by the UI."""
+    import streamlit as st
+
+    return st.cache_data(ttl=2.0, show_spinner=False)(_load_trials)
+
+
 def render_fn(state):
     import streamlit as st
     import streamlit.components.v1 as components
-    from sqlmodel import create_engine, select, Session
+    from sqlalchemy.orm import sessionmaker
+    from sqlmodel import create_engine, Session
 
-    if "database" not in st.session_state:
-        engine = create_engine(f"sqlite:///{state.db.db_file_name}", echo=True)
-        st.session_state["engine"] = engine
+    if "engine" not in st.session_state:
+        engine = create_engine(
+            f"sqlite:///{state.db.db_file_name}",
+            connect_args={"check_same_thread": False},
+            pool_pre_ping=True,
+        )
+        st.session_state["engine"] = enable_sqlite_pragmas(engine)
+        st.session_state["session_factory"] = sessionmaker(bind=engine, class_=Session)
 
-    with Session(st.session_state["engine"]) as session:
-        trials: List[Trial] = session.exec(select(Trial)).all()
+    # The leading underscore excludes the session factory from the cache key.
+    trials = _get_trials_loader()(st.session_state["session_factory"], state.db.db_file_name)
 
     if not trials:
         st.header("You haven't launched any sweeps yet.")
@@ -96,34 +247,37 @@ def render_fn(state):
         )
         return
 
+    # The trials are ordered by user and sweep in SQL, so each sweep is a contiguous group.
     user_sweeps = {}
-    for trial in trials:
-        username, sweep_id = trial.sweep_id.split("-")
-        if username not in user_sweeps:
-            user_sweeps[username] = {}
-        if sweep_id not in user_sweeps[username]:
-            user_sweeps[username][sweep_id] = []
-        user_sweeps[username][sweep_id].append(trial)
+    for (username, full_sweep_id), sweep_trials in groupby(
+        trials, key=lambda trial: (trial["username"], trial["sweep_id"])
+    ):
+        # The trials stored before the username column existed don't have one.
+        username = username or get_username(full_sweep_id)
+        sweep_id = full_sweep_id.split("-", 1)[-1]
+        user_sweeps.setdefault(username, {}).setdefault(sweep_id, []).extend(sweep_trials)
 
     user_tabs = st.tabs(list(user_sweeps))
     for tab, username in zip(user_tabs, user_sweeps):
         with tab:
             for sweep_id, trials in user_sweeps[username].items():
-                status = "/ Succeeded" if trial.has_succeeded else "/ Failed"
+                status = "/ Succeeded" if all(trial["has_succeeded"] for trial in trials) else "/ Failed"
                 with st.expander(f"{sweep_id} {status}"):
                     trials_tab, logging_tab = st.tabs(["Trials", "Logging"])
                     with trials_tab:
                         for trial in trials:
-                            if st.checkbox(f"Trial {trial.trial_id}", key=f"checkbox_{trial.id}_{sweep_id}"):
+                            if st.checkbox(f"Trial {trial['trial_id']}", key=f"checkbox_{trial['id']}_{sweep_id}"):
+                                with st.session_state["session_factory"]() as session:
+                                    details = session.get(Trial, trial["id"])
                                 st.json(
                                     {
-                                        "params": trial.params,
-                                        "monitor": trial.monitor,
-                                        "best_model_score": trial.best_model_score,
+                                        "params": details.params,
+                                        "monitor": details.monitor,
+                                        "best_model_score": details.best_model_score,
                                     }
                                 )
                     with logging_tab:
-                        components.html(f'<a href="{trial.url}" target="_blank">Weights & Biases URL</a>', height=50)
+                        components.html(f'<a href="{trial["url"]}" target="_blank">Weights & Biases URL</a>', height=50)
 
 
 class HPOSweeper(LightningFlow):
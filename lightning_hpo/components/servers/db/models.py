@@ -1,11 +1,14 @@
 from typing import Optional
 
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, Index, SQLModel
 
 
 class Trial(SQLModel, table=True):
+    __table_args__ = (Index("idx_trial_user_sweep", "username", "sweep_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     sweep_id: str = Field(index=True)
+    username: Optional[str]
     trial_id: int
     best_model_score: Optional[float]
     monitor: Optional[str]
@@ -14,3 +17,8 @@ class Trial(SQLModel, table=True):
     has_succeeded: bool
     url: Optional[str]
     params: Optional[str]
+
+
+def get_username(sweep_id: str) -> str:
+    """Returns the user who launched the sweep, the sweep ids are formatted as ``{username}-{id}``."""
+    return sweep_id.split("-")[0]
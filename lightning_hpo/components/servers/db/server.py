@@ -1,8 +1,12 @@
+from typing import List
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from lightning import BuildConfig, LightningWork
 from uvicorn import run
 
-from lightning_hpo.components.servers.db.models import Trial
+from lightning_hpo.components.servers.db.models import get_username, Trial
+from lightning_hpo.components.servers.db.utils import enable_sqlite_pragmas, migrate_trial_table
 
 
 class Database(LightningWork):
@@ -10,27 +14,38 @@ class Database(LightningWork):
         self,
         db_file_name: str = "database.db",
     ):
-        super().__init__(parallel=True, cloud_build_config=BuildConfig(["sqlmodel"]))
+        super().__init__(parallel=True, cloud_build_config=BuildConfig(["sqlmodel", "orjson"]))
         self.db_file_name = db_file_name
 
     def run(self):
         from sqlmodel import create_engine, Session, SQLModel
 
-        app = FastAPI()
-        engine = create_engine(f"sqlite:///{self.db_file_name}", echo=True)
+        app = FastAPI(default_response_class=ORJSONResponse)
+        engine = enable_sqlite_pragmas(create_engine(f"sqlite:///{self.db_file_name}", echo=True))
 
         @app.on_event("startup")
         def on_startup():
             SQLModel.metadata.create_all(engine)
+            migrate_trial_table(engine)
 
         @app.post("/trial/")
         def insert_trial(trial: Trial):
+            trial.username = get_username(trial.sweep_id)
             with Session(engine) as session:
                 session.add(trial)
                 session.commit()
                 session.refresh(trial)
                 return trial
 
+        @app.post("/trials/")
+        def insert_trials(trials: List[Trial]):
+            for trial in trials:
+                trial.username = get_username(trial.sweep_id)
+            with Session(engine) as session:
+                session.add_all(trials)
+                session.commit()
+            return {"count": len(trials)}
+
         run(app, host=self.host, port=self.port)
 
     def alive(self):
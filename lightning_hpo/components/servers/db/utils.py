@@ -0,0 +1,38 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def enable_sqlite_pragmas(engine: Engine) -> Engine:
+    """Applies WAL journaling and relaxed syncing to every connection opened by the engine."""
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def migrate_trial_table(engine: Engine):
+    """Adds the ``username`` column and its index to a trial table created before they existed."""
+    with engine.begin() as connection:
+        columns = [row[1] for row in connection.exec_driver_sql("PRAGMA table_info(trial)")]
+        if "username" in columns:
+            return
+        connection.exec_driver_sql("ALTER TABLE trial ADD COLUMN username VARCHAR")
+        # Same rule as ``get_username``: the sweep ids without a dash are the username.
+        connection.exec_driver_sql(
+            "UPDATE trial SET username = CASE WHEN instr(sweep_id, '-') > 0 "
+            "THEN substr(sweep_id, 1, instr(sweep_id, '-') - 1) ELSE sweep_id END"
+        )
+        connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_trial_user_sweep ON trial (username, sweep_id)")
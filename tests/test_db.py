@@ -0,0 +1,44 @@
+import os
+from unittest import mock
+
+from sqlalchemy import create_engine
+
+from lightning_hpo.components.servers.db.utils import migrate_trial_table
+
+
+def test_migrate_trial_table(tmpdir):
+    engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'database.db')}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE trial (id INTEGER PRIMARY KEY, sweep_id VARCHAR, trial_id INTEGER)")
+        connection.exec_driver_sql("INSERT INTO trial (sweep_id, trial_id) VALUES ('a-1234', 0), ('b', 0)")
+
+    migrate_trial_table(engine)
+    # The migration is a no-op once the column exists.
+    migrate_trial_table(engine)
+
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT sweep_id, username FROM trial ORDER BY id").fetchall()
+        assert [tuple(row) for row in rows] == [("a-1234", "a"), ("b", "b")]
+        indexes = [row[1] for row in connection.exec_driver_sql("PRAGMA index_list(trial)")]
+        assert indexes == ["idx_trial_user_sweep"]
+
+
+def test_database_insert_trials(tmpdir):
+    from fastapi.testclient import TestClient
+
+    from lightning_hpo.components.servers.db.server import Database
+
+    db = Database(db_file_name=os.path.join(tmpdir, "database.db"))
+    with mock.patch("lightning_hpo.components.servers.db.server.run") as run:
+        db.run()
+    trials = [
+        {"sweep_id": sweep_id, "trial_id": 0, "name": "trial_0", "has_succeeded": True} for sweep_id in ("a-1234", "b")
+    ]
+    with TestClient(run.call_args[0][0]) as client:
+        response = client.post("/trials/", json=trials)
+    assert response.json() == {"count": 2}
+
+    engine = create_engine(f"sqlite:///{db.db_file_name}")
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT sweep_id, username FROM trial ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [("a-1234", "a"), ("b", "b")]
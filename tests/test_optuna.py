@@ -0,0 +1,31 @@
+import optuna
+from optuna.trial import TrialState
+
+from lightning_hpo.algorithm.optuna import OptunaAlgorithm
+
+
+def test_optuna_algorithm_reports_reset_on_restart():
+    algorithm = OptunaAlgorithm(optuna.create_study(pruner=optuna.pruners.NopPruner()))
+    algorithm.trial_start(0)
+
+    assert not algorithm.should_prune(0, [(1.0, 0), (0.5, 1)])
+    assert algorithm.reports[0] == [(1.0, 0), (0.5, 1)]
+    # Only the new report is sent to the study.
+    assert not algorithm.should_prune(0, [(1.0, 0), (0.5, 1), (0.25, 2)])
+    assert algorithm.study.trials[0].intermediate_values == {0: 1.0, 1: 0.5, 2: 0.25}
+
+    # The objective restarted, so it reports from the first step again.
+    assert not algorithm.should_prune(0, [(2.0, 0)])
+    assert algorithm.reports[0] == [(2.0, 0)]
+
+
+def test_optuna_algorithm_prunes_trial_in_study():
+    pruner = optuna.pruners.MedianPruner(n_startup_trials=1, n_warmup_steps=0)
+    algorithm = OptunaAlgorithm(optuna.create_study(direction="minimize", pruner=pruner))
+    algorithm.trial_start(0)
+    assert not algorithm.should_prune(0, [(1.0, 0)])
+    algorithm.trial_end(0, 1.0)
+
+    algorithm.trial_start(1)
+    assert algorithm.should_prune(1, [(10.0, 0)])
+    assert algorithm.study.trials[1].state == TrialState.PRUNED
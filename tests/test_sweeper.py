@@ -0,0 +1,41 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from lightning_hpo.app.sweeper import Sweeper
+from lightning_hpo.components.servers.db.models import Trial
+
+
+def test_sweeper_storage_connections_use_sqlite_pragmas(tmpdir):
+    sweeper = SimpleNamespace(_storage=None, db=SimpleNamespace(db_file_name=os.path.join(tmpdir, "database.db")))
+    storage = Sweeper._get_storage(sweeper)
+    with storage.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+
+def _trial(trial_id, score, path, has_succeeded=True):
+    return Trial(
+        sweep_id="a-1234",
+        trial_id=trial_id,
+        best_model_score=score,
+        best_model_path=path,
+        name=f"trial_{trial_id}",
+        has_succeeded=has_succeeded,
+    )
+
+
+@pytest.mark.parametrize("direction, best_path", [("minimize", "0.ckpt"), ("maximize", "1.ckpt")])
+def test_sweeper_update_best(direction, best_path):
+    sweeper = SimpleNamespace(_directions={"a-1234": direction}, _best_score=float("-inf"), _best_path=None)
+    for trial in [_trial(0, 0.1, "0.ckpt"), _trial(1, 0.9, "1.ckpt"), _trial(2, None, "2.ckpt", has_succeeded=False)]:
+        Sweeper._update_best(sweeper, trial)
+    assert sweeper._best_path == best_path
+
+
+def test_sweeper_update_best_without_checkpoint():
+    sweeper = SimpleNamespace(_directions={"a-1234": "maximize"}, _best_score=float("-inf"), _best_path=None)
+    Sweeper._update_best(sweeper, _trial(0, 0.5, "None"))
+    assert sweeper._best_score == 0.5
+    assert sweeper._best_path is None